@@ -1,7 +1,199 @@
 import fitz  # PyMuPDF
 import os
+import sys
+import glob
+import shutil
+import tempfile
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+# Resource name of the standard (non-embedded) Helvetica font
+_FONT_NAME = "helv"
+
+# The process umask, read once at import: mkstemp creates files as 0600, and
+# titled copies should get the same mode a plain save would have given them
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+# How many files beyond those being worked on to pull into the page cache
+_PREFETCH_AHEAD = 2
+
+def _prefetch(path):
+    """
+    Ask the kernel to start reading a file into the page cache in the background.
+    Does nothing on platforms without posix_fadvise (Windows, macOS).
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+    except OSError:
+        # Purely an optimization; the real read will report any problem
+        pass
+
+def _pdf_number(value):
+    """
+    Format a number for a content stream. PDF has no exponent notation, so
+    use fixed point with trailing zeros stripped (1e-05 -> 0, 24.0 -> 24).
+    """
+    text = f"{float(value):.4f}".rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+def _title_stream_parts(title_text, font_size, color):
+    """
+    Build the content stream that draws the title, split around the text position.
+    Everything except the position is fixed per document, so the font size and
+    color are formatted once here. The text is written as a WinAnsi hex string,
+    so no escaping is needed.
+    
+    Returns:
+        (head, tail) bytes; the stream is head + b"<x> <y>" + tail
+    """
+    r, g, b = (_pdf_number(c) for c in color)
+    text = title_text.encode("cp1252", errors="replace").hex()
+    head = f"q {r} {g} {b} rg BT /{_FONT_NAME} {_pdf_number(font_size)} Tf 1 0 0 1 ".encode()
+    tail = f" Tm <{text}> Tj ET Q\n".encode()
+    return head, tail
+
+def _new_stream(doc, data):
+    """Add a new stream object holding data to doc and return its xref."""
+    xref = doc.get_new_xref()
+    doc.update_object(xref, "<<>>")
+    doc.update_stream(xref, data)
+    return xref
+
+def _work_file_prefix(output_path):
+    """Name prefix of the hidden temporary copies staged for output_path."""
+    return f".{os.path.basename(output_path)}."
+
+def _discard_stale_work_files(output_path):
+    """Remove temporary copies for output_path left behind by an interrupted worker."""
+    directory = os.path.dirname(os.path.abspath(output_path))
+    for path in glob.glob(os.path.join(glob.escape(directory), glob.escape(_work_file_prefix(output_path)) + "*.tmp")):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def _prepare_output(input_path, output_path):
+    """
+    Stage a byte copy of the input PDF next to the output location.
+    Starting from a byte copy lets the title overlay be appended incrementally
+    instead of re-writing every object. The copy goes to a hidden temporary
+    file that only replaces output_path once it is fully titled, so an
+    interrupted run never leaves an untitled file under the final name.
+    
+    Returns:
+        Path of the file to title: the temporary copy, or input_path itself
+        when titling in place
+    """
+    # Titling in place: the file is updated incrementally, no copy needed.
+    # samefile also catches symlinks and case-insensitive path spellings.
+    if os.path.exists(output_path) and os.path.samefile(input_path, output_path):
+        return input_path
+    
+    fd, work_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(output_path)),
+        prefix=_work_file_prefix(output_path),
+        suffix=".tmp",
+    )
+    os.close(fd)
+    try:
+        shutil.copyfile(input_path, work_path)
+        os.chmod(work_path, 0o666 & ~_UMASK)
+    except BaseException:
+        os.remove(work_path)
+        raise
+    return work_path
+
+def _title_pdf(work_path, title_text, font_size, position, color):
+    """
+    Add the title to every page of the PDF at work_path and save it in place.
+    Returns None if the file was updated incrementally, or the bytes of the
+    fully re-written document if it could not be saved incrementally.
+    """
+    doc = fitz. open(work_path, filetype="pdf")
+    
+    try:
+        # Every page is wrapped in the same shared "q"/"Q" streams so its own
+        # content can't leak transforms into the title, and pages with the same
+        # geometry share a single title stream. Per page only /Contents and the
+        # font resource change, so memory stays flat however long the document.
+        push = _new_stream(doc, b"q\n")
+        pop = _new_stream(doc, b"\nQ\n")
+        streams = {}
+        head, tail = _title_stream_parts(title_text, font_size, color)
+        
+        for page in doc:
+            # Insert text at specified position, converted to PDF coordinates
+            point = fitz.Point(position) * ~page.transformation_matrix
+            key = (point.x, point.y)
+            if key not in streams:
+                streams[key] = _new_stream(doc, head + f"{_pdf_number(point.x)} {_pdf_number(point.y)}".encode() + tail)
+            
+            page.insert_font(fontname=_FONT_NAME)
+            contents = [push] + page.get_contents() + [pop, streams[key]]
+            doc.xref_set_key(page.xref, "Contents", "[" + " ".join(f"{xref} 0 R" for xref in contents) + "]")
+        
+        # Save the modified PDF
+        if doc.can_save_incrementally():
+            doc.save(work_path, incremental=True, deflate=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+            return None
+        
+        # Repaired or otherwise non-incremental documents need a full re-write
+        return doc.tobytes(deflate=True, garbage=3)
+    finally:
+        doc.close()
+
+def _finish_output(input_path, work_path, output_path, data):
+    """
+    Write out a fully re-written PDF if there is one, then move the titled
+    temporary copy onto output_path in a single atomic rename.
+    """
+    if data is not None:
+        with open(work_path, "wb") as f:
+            f.write(data)
+    if work_path != input_path:
+        os.replace(work_path, output_path)
+
+def _discard_work_file(input_path, work_path):
+    """Remove a temporary copy that never made it to its final name."""
+    if work_path and work_path != input_path and os.path.exists(work_path):
+        os.remove(work_path)
+
+def _failure_message(input_path, work_path, error):
+    """Format a processing error, naming the input rather than its temporary copy."""
+    message = str(error)
+    if work_path:
+        message = message.replace(os.fspath(work_path), os.fspath(input_path))
+    return f"  ✗ Error processing {input_path}: {message}"
+
+def _try_add_title_to_pdf(input_path, output_path, title_text, font_size, position, color):
+    """
+    Run add_title_to_pdf without printing.
+    
+    Returns:
+        None on success, or the error message for the file
+    """
+    work_path = None
+    try:
+        work_path = _prepare_output(input_path, output_path)
+        data = _title_pdf(work_path, title_text, font_size, position, color)
+        _finish_output(input_path, work_path, output_path, data)
+        return None
+        
+    except Exception as e:
+        return _failure_message(input_path, work_path, e)
+    finally:
+        _discard_work_file(input_path, work_path)
+
 def add_title_to_pdf(input_path, output_path, title_text, font_size=24, position=(50, 50), color=(0, 0, 0)):
     """
     Add a title to the upper left corner of each page in a PDF.  
@@ -14,38 +206,165 @@ def add_title_to_pdf(input_path, output_path, title_text, font_size=24, position
         position: Tuple (x, y) for text position in pixels (default:  50, 50)
         color: RGB tuple for text color (default:  black)
     """
+    error = _try_add_title_to_pdf(input_path, output_path, title_text, font_size, position, color)
+    if error is not None:
+        print(error)
+        return False
+    return True
+
+def _add_title_to_pdf_job(indexed_job):
+    """
+    Pool entry point: run one (index, job) pair.
+    Errors are returned rather than printed, so the parent can report them
+    together with the rest of the file's output.
+    
+    Returns:
+        (index, success, error message or None)
+    """
+    i, job = indexed_job
+    error = _try_add_title_to_pdf(*job)
+    return i, error is None, error
+
+def _process_pdfs_pipelined(jobs, queue_size=4):
+    """
+    Process PDFs one at a time while overlapping file I/O with title insertion.
+    
+    An opener thread stages temporary copies of upcoming inputs and a writer
+    thread flushes documents that needed a full re-write and renames them
+    into place. All PyMuPDF calls stay on the calling thread, since MuPDF is
+    not thread-safe. If the generator is closed early, the opener stops and
+    any copies it already staged are removed.
+    
+    Args:
+        jobs: List of argument tuples for add_title_to_pdf
+        queue_size: Maximum number of files buffered between stages
+    
+    Yields:
+        (index, success, error message or None) for each job, in completion order
+    """
+    in_q = queue.Queue(maxsize=queue_size)
+    out_q = queue.Queue(maxsize=queue_size)
+    done_q = queue.Queue()
+    stop = threading.Event()
+    
+    def opener():
+        for i, (input_path, output_path, *_) in enumerate(jobs):
+            if stop.is_set():
+                break
+            # Start reading ahead while this file is being copied
+            if i + _PREFETCH_AHEAD < len(jobs):
+                _prefetch(jobs[i + _PREFETCH_AHEAD][0])
+            try:
+                in_q.put((i, _prepare_output(input_path, output_path), None))
+            except Exception as e:
+                in_q.put((i, None, e))
+        in_q.put(None)
+    
+    def writer():
+        while (item := out_q.get()) is not None:
+            i, work_path, data = item
+            input_path, output_path = jobs[i][:2]
+            try:
+                _finish_output(input_path, work_path, output_path, data)
+                done_q.put((i, True, None))
+            except Exception as e:
+                done_q.put((i, False, _failure_message(input_path, work_path, e)))
+            finally:
+                _discard_work_file(input_path, work_path)
+    
+    opener_thread = threading.Thread(target=opener, daemon=True)
+    writer_thread = threading.Thread(target=writer, daemon=True)
+    opener_thread.start()
+    writer_thread.start()
+    
     try:
-        doc = fitz. open(input_path)
-        
-        for page_num, page in enumerate(doc, 1):
-            # Insert text at specified position
-            page.insert_text(
-                position,
-                title_text,
-                fontsize=font_size,
-                color=color,
-                fontname="helv"  # Use standard Helvetica font
-            )
-        
-        # Save the modified PDF
-        doc. save(output_path)
-        doc.close()
-        return True
+        while (item := in_q.get()) is not None:
+            i, work_path, error = item
+            input_path, output_path, *title_args = jobs[i]
+            handed_off = False
+            try:
+                if error is None:
+                    out_q.put((i, work_path, _title_pdf(work_path, *title_args)))
+                    handed_off = True
+            except Exception as e:
+                error = e
+            finally:
+                # The writer owns the copy once handed off; otherwise it's ours to remove
+                if not handed_off:
+                    _discard_work_file(input_path, work_path)
+            if error is not None:
+                yield i, False, _failure_message(input_path, work_path, error)
+            
+            # Report whatever the writer has finished so far
+            while not done_q.empty():
+                yield done_q.get()
+    finally:
+        # Stop staging copies and remove the ones that will never be titled
+        stop.set()
+        while opener_thread.is_alive() or not in_q.empty():
+            try:
+                item = in_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is not None:
+                i, work_path, _ = item
+                _discard_work_file(jobs[i][0], work_path)
+        opener_thread.join()
         
-    except Exception as e:
-        print(f"  ✗ Error processing {input_path}: {e}")
-        return False
+        out_q.put(None)
+        writer_thread.join()
+    
+    while not done_q.empty():
+        yield done_q.get()
 
-def process_pdfs_in_directory(directory_path, font_size=24, position=(50, 80), color=(0, 0, 0)):
+def _run_jobs(jobs, num_workers):
+    """
+    Run add_title_to_pdf over all jobs.
+    With a single worker a process pool buys nothing, so disk reads and
+    writes are overlapped with the title insertion instead.
+    
+    Yields:
+        (index, success, error message or None) for each job, in completion order
+    """
+    if num_workers == 1:
+        yield from _process_pdfs_pipelined(jobs)
+        return
+    
+    # Keep the files the workers will pick up next warm in the page cache
+    ahead = num_workers + _PREFETCH_AHEAD
+    finished = set()
+    try:
+        with ThreadPoolExecutor(max_workers=2) as prefetcher, \
+                multiprocessing.Pool(processes=num_workers) as pool:
+            for job in jobs[:ahead]:
+                prefetcher.submit(_prefetch, job[0])
+            
+            for done, result in enumerate(pool.imap_unordered(_add_title_to_pdf_job, enumerate(jobs))):
+                if ahead + done < len(jobs):
+                    prefetcher.submit(_prefetch, jobs[ahead + done][0])
+                finished.add(result[0])
+                yield result
+    finally:
+        # Workers terminated mid-file (e.g. on Ctrl-C) can't clean up after themselves
+        for i, (input_path, output_path, *_) in enumerate(jobs):
+            if i not in finished:
+                _discard_stale_work_files(output_path)
+
+def process_pdfs_in_directory(directory_path, font_size=24, position=(50, 80), color=(0, 0, 0), num_workers=None,
+                              skip_up_to_date=True):
     """
     Process all PDF files in a directory and add their filename as title.
     Creates a 'titled' subfolder for output files.
+    Files are processed in parallel using a pool of worker processes, or
+    through a threaded read/title/write pipeline when only one worker is used.
     
     Args:
         directory_path: Path to directory containing PDFs
         font_size: Size of the title text (default: 24)
         position: Tuple (x, y) for text position in pixels
         color:  RGB tuple for text color (0-1 range for each component)
+        num_workers: Number of worker processes (default: min(cpu_count, 4))
+        skip_up_to_date: Skip PDFs whose titled copy is newer than the source (default: True)
     """
     path = Path(directory_path)
     
@@ -67,37 +386,66 @@ def process_pdfs_in_directory(directory_path, font_size=24, position=(50, 80), c
         return
     
     # Find all PDF files in the main directory (not in subdirectories)
-    pdf_files = list(path.glob("*.pdf")) + list(path.glob("*.PDF"))
+    # A single scandir pass; matching the suffix case-insensitively avoids
+    # listing files twice on case-insensitive filesystems
+    with os.scandir(path) as entries:
+        pdf_files = [Path(e.path) for e in entries if e.is_file() and e.name.lower().endswith(".pdf")]
     
     if not pdf_files: 
         print(f"⚠️  No PDF files found in '{directory_path}'")
         return
     
     print(f"📄 Found {len(pdf_files)} PDF file(s) in '{directory_path}'")
-    print(f"⚙️  Settings:  font_size={font_size}, position={position}\n")
-    
-    success_count = 0
     
+    # Get filename without extension as title and
+    # output to 'titled' subdirectory with same filename
+    jobs = []
+    up_to_date = []
     for pdf_file in pdf_files:
-        # Get filename without extension as title
-        title = pdf_file.stem
+        output_path = output_dir / pdf_file.name
         
-        print(f"📄 Processing:  {pdf_file.name}")
-        print(f"   Title:  '{title}'")
+        # A titled copy newer than its source is left alone
+        if skip_up_to_date and output_path.exists() and output_path.stat().st_mtime >= pdf_file.stat().st_mtime:
+            up_to_date.append(pdf_file)
+            continue
         
-        # Output to 'titled' subdirectory with same filename
-        output_path = output_dir / pdf_file.name
+        jobs.append((pdf_file, output_path, pdf_file.stem, font_size, position, color))
+    
+    if num_workers is None:
+        num_workers = min(os.cpu_count() or 1, 4)
+    num_workers = max(1, min(num_workers, len(jobs)))
+    
+    print(f"⚙️  Settings:  font_size={font_size}, position={position}, workers={num_workers}, "
+          f"skip_up_to_date={skip_up_to_date}\n")
+    
+    if up_to_date:
+        sys.stdout.write(
+            "".join(f"⏭️  Up to date:  {pdf_file.name}\n" for pdf_file in up_to_date)
+            + "   (titled copies newer than their source are skipped; "
+            "re-title them to apply new settings)\n\n"
+        )
+    
+    success_count = len(up_to_date)
+    
+    # Process the PDFs, reporting each one as soon as it is done
+    for done, (i, ok, error) in enumerate(_run_jobs(jobs, num_workers), 1):
+        pdf_file, output_path, title = jobs[i][:3]
         
-        # Process the PDF
-        if add_title_to_pdf(pdf_file, output_path, title, font_size, position, color):
-            print(f"   ✅ Saved to:  titled/{output_path.name}\n")
+        # One write per file instead of a print per line
+        msg = f"📄 Processed ({done}/{len(jobs)}):  {pdf_file.name}\n   Title:  '{title}'\n"
+        if ok:
+            msg += f"   ✅ Saved to:  titled/{output_path.name}\n"
             success_count += 1
         else:
-            print()
+            msg += f"{error}\n"
+        sys.stdout.write(msg + "\n")
     
-    print(f"{'='*60}")
-    print(f"✨ Processing complete! {success_count}/{len(pdf_files)} files processed successfully.")
-    print(f"   All titled PDFs saved in:  {output_dir}")
+    sys.stdout.write(
+        f"{'='*60}\n"
+        f"✨ Processing complete! {success_count}/{len(pdf_files)} files processed successfully.\n"
+        f"   All titled PDFs saved in:  {output_dir}\n"
+    )
+    sys.stdout.flush()
 
 def get_font_size_from_user():
     """
@@ -128,7 +476,7 @@ def get_font_size_from_user():
             print("❌ Invalid input. Please enter a number.")
 
 def main():
-    """Main function with user prompts for path and font size."""
+    """Main function with user prompts for path, font size and re-titling."""
     
     print("=" * 60)
     print("PDF Title Adder - Add filename as title to each page")
@@ -148,6 +496,10 @@ def main():
     # Get font size from user
     font_size = get_font_size_from_user()
     
+    # Existing titled copies are kept unless the user asks to redo them,
+    # e.g. after changing the font size
+    redo = input("Re-title PDFs that already have an up-to-date titled copy? (y/N): ").strip().lower()
+    
     print()
     
     # ==================== CONFIGURATION ====================
@@ -167,7 +519,8 @@ def main():
         pdf_directory,
         font_size=font_size,
         position=POSITION,
-        color=COLOR
+        color=COLOR,
+        skip_up_to_date=(redo != 'y')
     )
 
 if __name__ == "__main__": 
@@ -2,35 +2,66 @@
 """
 merge_pdfs_robust.py
 
-A robust script to merge PDF files, handling "Stream has ended unexpectedly"
-and "NullObject" errors by reading files in non-strict mode.
+A robust script to merge PDF files using PyMuPDF. Malformed inputs
+("Stream has ended unexpectedly", "NullObject" errors) are repaired by
+MuPDF on open, and files that cannot be opened at all are skipped.
 """
 import os
 import sys
 import glob
 import re
-from PyPDF2 import PdfMerger
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import fitz  # PyMuPDF
 
-# Try to import PdfReader (newer PyPDF2), fallback to PdfFileReader (older PyPDF2)
-try:
-    from PyPDF2 import PdfReader
-except ImportError:
-    from PyPDF2 import PdfFileReader as PdfReader
+# Compiled once; natural_sort_key runs for every file being merged
+_NUM_RE = re.compile(r'(\d+)')
+
+# Document info fields carried over into the merged PDF. Dates describe the
+# individual inputs and format/encryption are read-only, so they are left out.
+_MERGED_METADATA_KEYS = ("title", "author", "subject", "keywords", "creator", "producer", "trapped")
+
+# Input files held fully in memory at once by the merge, counting the one
+# being merged and those read ahead of it
+_READ_AHEAD = min(os.cpu_count() or 1, 4)
 
 def natural_sort_key(s):
     """
     Key for natural sorting of strings.
-    Splits 'Page 1.pdf' into ['Page ', 1, '.pdf'] for correct ordering.
+    Turns 'Page 1.pdf' into b'page \\x0000000000000000000001\\x00.pdf\\x00' for correct ordering.
+    Numbers are zero-padded to a fixed width so the whole key compares as plain bytes,
+    and each segment ends in a NUL byte so a shorter segment sorts before a longer one
+    it prefixes, exactly as when comparing the segments one by one.
     """
     filename = os.path.basename(s)
-    parts = re.split(r'(\d+)', filename)
-    converted_parts = []
-    for part in parts:
-        if part.isdigit():
-            converted_parts.append(int(part))
-        else:
-            converted_parts.append(part.lower())
-    return converted_parts
+    return b''.join(
+        (part.zfill(20).encode() if part.isdigit() else part.lower().encode()) + b'\x00'
+        for part in _NUM_RE.split(filename)
+    )
+
+def _read_pdf(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def _read_ahead(paths, window):
+    """
+    Yield (path, future) pairs in order while reading the next files ahead
+    on background threads. future.result() returns the file's bytes or raises
+    the read error. File reads release the GIL, so disk latency overlaps with
+    the merging done by the caller.
+    
+    At most `window` files are in flight or in memory at once, including the
+    one last yielded, as long as the caller drops each future before asking
+    for the next.
+    """
+    with ThreadPoolExecutor(max_workers=window) as executor:
+        pending = deque()
+        for path in paths:
+            pending.append((path, executor.submit(_read_pdf, path)))
+            if len(pending) >= window:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
 
 def merge_pdfs_in_folder(folder_path: str, output_name: str = "ALL.pdf"):
     if not os.path.isdir(folder_path):
@@ -50,37 +81,50 @@ def merge_pdfs_in_folder(folder_path: str, output_name: str = "ALL.pdf"):
     # Sort files
     pdf_files.sort(key=natural_sort_key)
 
-    merger = PdfMerger()
-    file_handles = [] # Keep files open until merge is done
+    dst = fitz.open()
+    metadata = {}
 
     try:
-        for pdf in pdf_files:
+        # PyMuPDF is not thread-safe, so only the file reads run in parallel;
+        # parsing and copying stay on this thread in sorted order.
+        for pdf, data in _read_ahead(pdf_files, _READ_AHEAD):
             print(f"Adding {os.path.basename(pdf)}...")
             
-            # Open file in binary read mode
-            f = open(pdf, 'rb')
-            file_handles.append(f)
-            
+            page_count = dst.page_count
             try:
-                # strict=False is the specific fix for "Stream has ended unexpectedly"
-                # and "NullObject" errors. It attempts to repair malformed PDFs.
-                reader = PdfReader(f, strict=False)
-                merger.append(reader)
+                # MuPDF repairs broken xref tables and truncated streams on open,
+                # which covers the "Stream has ended unexpectedly" and "NullObject" cases.
+                # Each source is released as soon as its pages are copied, so only
+                # a bounded window of input files is held in memory at a time.
+                with fitz.open(stream=data.result(), filetype="pdf") as src:
+                    if src.needs_pass:
+                        raise ValueError("document is password-protected")
+                    dst.insert_pdf(src)
+                    # The first file to set a descriptive field provides it
+                    for key, value in src.metadata.items():
+                        if value and key in _MERGED_METADATA_KEYS:
+                            metadata.setdefault(key, value)
             except Exception as e:
+                # insert_pdf can fail after appending some pages; drop them
+                if dst.page_count > page_count:
+                    dst.delete_pages(from_page=page_count)
                 print(f"  [WARNING] Could not read {os.path.basename(pdf)}: {e}")
                 print(f"  Skipping this file.")
 
+            # Release this file's bytes before the next read is started
+            del data
+
         print("Writing merged PDF...")
-        merger.write(output_path)
+        dst.set_metadata(metadata)
+        # Deduplicate objects, compress streams and pack the remaining
+        # objects into compressed object streams in a single pass
+        dst.save(output_path, garbage=4, deflate=True, clean=True, use_objstms=True)
         print(f"Merge complete! Saved as '{output_name}'.")
 
     except Exception as e:
         print(f"Failed to write merged PDF: {e}")
     finally:
-        merger.close()
-        # Close all file handles
-        for f in file_handles:
-            f.close()
+        dst.close()
 
 def main():
     if len(sys.argv) != 2: